@@ -10,9 +10,19 @@ Created for HackWashU Databases Workshop
 """
 
 import csv
+import gzip
 import os
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote_plus
 import requests
+from requests.adapters import HTTPAdapter
+
+# Use the faster orjson parser if it's installed, otherwise Python's json
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
 # ============================================
 # CONFIGURATION - Change these if you want!
@@ -36,10 +46,38 @@ ARTISTS = [
 # How many songs to fetch per artist
 SONGS_PER_ARTIST = 50
 
+# How many artists to fetch from iTunes at the same time
+FETCH_WORKERS = 10
+
 # Where to save files
 EXPORTS_FOLDER = "exports"
 DATABASE_FILE = os.path.join(EXPORTS_FOLDER, "music_library.db")
 
+# Save CSVs gzip-compressed (songs.csv.gz) to write far fewer bytes to disk
+COMPRESS_CSV = False
+
+# How many bytes to collect in memory before each write to a CSV file (1 MB)
+CSV_BUFFER_SIZE = 1 << 20
+
+# How many rows to read from the database (and write to CSV) at a time.
+# Bigger = fewer round trips, smaller = less memory used during export.
+CSV_CHUNK_ROWS = 10000
+
+# iTunes Search API address; the limit and search term are filled in per artist
+_ITUNES_URL = "https://itunes.apple.com/search?entity=song&limit={}&term={}"
+
+# Seconds to wait for (connecting, reading the response).
+# A dead connection fails fast, while a slow download still gets time.
+_ITUNES_TIMEOUT = (3.05, 10)
+
+# One shared HTTP session for every iTunes request.
+# Reusing it keeps the connection to itunes.apple.com open between artists,
+# so we only pay for the connection setup (TCP + TLS handshake) once.
+_SESSION = requests.Session()
+# Ask for gzip: JSON text compresses very well, so far fewer bytes are sent
+_SESSION.headers.update({"User-Agent": "HackWashU/1.0", "Accept-Encoding": "gzip"})
+_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
 
 # ============================================
 # STEP 1: CREATE DATABASE TABLES
@@ -97,6 +135,21 @@ def create_tables(cursor):
     print("✅ Tables created!")
 
 
+def create_indexes(cursor):
+    """
+    Create indexes on the columns we JOIN and GROUP BY on (see explore_db.py).
+    An index works like the index at the back of a book: SQLite can jump
+    straight to matching rows instead of reading the whole table.
+    We build them after inserting, which is cheaper than updating them per row.
+    """
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_albums_artist ON albums(artist_id)"
+    )
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_songs_album ON songs(album_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_albums_year ON albums(year)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_albums_genre ON albums(genre)")
+
+
 # ============================================
 # STEP 2: FETCH DATA FROM ITUNES API
 # ============================================
@@ -105,134 +158,241 @@ def create_tables(cursor):
 def fetch_songs_from_itunes(artist_name):
     """
     Fetch songs from the iTunes API for a given artist.
-    Returns a list of song data (or empty list if error).
+    Returns (songs, error): songs is a list of song tuples
+    (artist_name, album_title, song_title, genre, release_date),
+    and error is None if everything worked (songs is empty if not).
+    This runs in a worker thread, so it doesn't print anything itself.
     """
-    print(f"\n🔍 Searching iTunes for '{artist_name}'...")
-
-    # Build the API URL (replace spaces with + signs)
-    search_term = artist_name.replace(" ", "+")
-    url = f"https://itunes.apple.com/search?term={search_term}&entity=song&limit={SONGS_PER_ARTIST}"
+    # Build the API URL
+    # quote_plus turns spaces into + and safely encodes characters like
+    # &, # or accented letters (e.g. "Simon & Garfunkel", "Beyoncé")
+    search_term = quote_plus(artist_name)
+    url = _ITUNES_URL.format(SONGS_PER_ARTIST, search_term)
 
     try:
-        # Make the request to iTunes
-        response = requests.get(url, timeout=10)
-        data = response.json()
-        results = data.get("results", [])
+        # Make the request to iTunes (using our shared session)
+        response = _SESSION.get(url, timeout=_ITUNES_TIMEOUT)
+        data = json_loads(response.content)
+
+        # iTunes sends dozens of fields per song; keep only the 5 we use
+        results = [
+            (
+                song.get("artistName"),
+                song.get("collectionName"),
+                song.get("trackName"),
+                song.get("primaryGenreName"),
+                song.get("releaseDate"),
+            )
+            for song in data.get("results", [])
+        ]
 
-        print(f"   Found {len(results)} songs!")
-        return results
+        return results, None
 
     except Exception as error:
-        print(f"   ⚠️ Error: {error}")
-        return []
+        return [], error
 
 
 # ============================================
 # STEP 3: SAVE DATA TO DATABASE
 # ============================================
 
+# INSERT ... RETURNING was added in SQLite 3.35
+SQLITE_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35)
 
-def save_to_database(cursor, all_songs):
+
+def save_to_database(cursor, songs, saved_artists, saved_albums):
     """
-    Save all the song data to our database tables.
-    We use dictionaries to avoid duplicate entries.
+    Save one batch of song data (one artist's search results) to our tables.
+    The saved_artists and saved_albums dictionaries remember what earlier
+    batches saved, so we never insert the same artist or album twice.
+    Each table is inserted in one go with executemany().
+    Returns how many songs were saved.
     """
-    print("\n💾 Saving to database...")
-
-    # Dictionaries to track what we've already saved
-    saved_artists = {}  # artist_name -> artist_id
-    saved_albums = {}  # (album_title, artist_id) -> album_id
-
-    song_count = 0
-
-    # Go through each song from the API
-    for song in all_songs:
-        # Get the data we need from the API response
-        artist_name = song.get("artistName")
-        album_title = song.get("collectionName")
-        song_title = song.get("trackName")
-        genre = song.get("primaryGenreName")
-        release_date = song.get("releaseDate", "")
-
+    # PASS 1: Clean up the API data
+    clean_songs = []  # (artist_name, album_title, song_title, genre, year)
+    add_clean_song = clean_songs.append  # look up .append once, not per song
+    for artist_name, album_title, song_title, genre, release_date in songs:
         # Skip if missing important data
-        if not artist_name or not album_title or not song_title:
+        if not (artist_name and album_title and song_title):
             continue
 
         # Get year from date (e.g., "2024-10-15T07:00:00Z" -> 2024)
-        year = None
-        if release_date:
-            year = release_date.split("-")[0]  # Get first part before "-"
-            try:
-                year = int(year)
-            except:
-                year = None
-
-        # STEP 1: Save artist (if we haven't already)
-        if artist_name not in saved_artists:
+        # The year is always the first 4 characters, so slicing is enough
+        if release_date and release_date[:4].isdigit():
+            year = int(release_date[:4])
+        else:
+            year = None
+
+        add_clean_song((artist_name, album_title, song_title, genre, year))
+
+    # PASS 2: Save the new artists in one batch and get back their IDs
+    # dict.fromkeys() removes duplicate names but keeps them in order
+    artist_names = [
+        artist_name
+        for artist_name in dict.fromkeys(row[0] for row in clean_songs)
+        if artist_name not in saved_artists
+    ]
+    if artist_names:
+        if SQLITE_HAS_RETURNING:
+            # One statement inserts the new names AND returns every ID.
+            # ON CONFLICT handles names already saved by a previous run.
+            placeholders = ", ".join(["(?)"] * len(artist_names))
             cursor.execute(
-                "INSERT OR IGNORE INTO artists (name) VALUES (?)", (artist_name,)
+                f"""
+                INSERT INTO artists (name) VALUES {placeholders}
+                ON CONFLICT(name) DO UPDATE SET name = excluded.name
+                RETURNING id, name
+            """,
+                artist_names,
             )
-            cursor.execute("SELECT id FROM artists WHERE name = ?", (artist_name,))
-            saved_artists[artist_name] = cursor.fetchone()[0]
-
-        artist_id = saved_artists[
-            artist_name
-        ]  # STEP 2: Save album (if we haven't already)
-        album_key = (album_title, artist_id)
-        if album_key not in saved_albums:
+        else:
+            # Older SQLite: insert first, then look the IDs up
+            cursor.executemany(
+                "INSERT OR IGNORE INTO artists (name) VALUES (?)",
+                [(artist_name,) for artist_name in artist_names],
+            )
+            placeholders = ", ".join("?" * len(artist_names))
             cursor.execute(
-                "INSERT INTO albums (title, artist_id, genre, year) VALUES (?, ?, ?, ?)",
-                (album_title, artist_id, genre, year),
+                f"SELECT id, name FROM artists WHERE name IN ({placeholders})",
+                artist_names,
             )
-            saved_albums[album_key] = cursor.lastrowid
-
-        album_id = saved_albums[album_key]
-
-        # STEP 3: Save song
+        for artist_id, artist_name in cursor.fetchall():
+            saved_artists[artist_name] = artist_id
+
+    # PASS 3: Save the new albums in one batch, then look up their IDs
+    new_albums = {}  # (album_title, artist_id) -> row to insert
+    for artist_name, album_title, song_title, genre, year in clean_songs:
+        album_key = (album_title, saved_artists[artist_name])
+        if album_key not in saved_albums and album_key not in new_albums:
+            new_albums[album_key] = (album_title, album_key[1], genre, year)
+
+    if new_albums:
+        # New albums get IDs after the current highest one
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM albums")
+        last_album_id = cursor.fetchone()[0]
+        cursor.executemany(
+            "INSERT INTO albums (title, artist_id, genre, year) VALUES (?, ?, ?, ?)",
+            new_albums.values(),
+        )
         cursor.execute(
-            "INSERT INTO songs (title, album_id) VALUES (?, ?)", (song_title, album_id)
+            "SELECT id, title, artist_id FROM albums WHERE id > ?", (last_album_id,)
         )
-        song_count += 1
+        for album_id, album_title, artist_id in cursor.fetchall():
+            saved_albums[(album_title, artist_id)] = album_id
 
-    print(
-        f"✅ Saved {len(saved_artists)} artists, {len(saved_albums)} albums, {song_count} songs!"
+    # PASS 4: Save all songs in one batch
+    songs_to_add = [
+        (song_title, saved_albums[(album_title, saved_artists[artist_name])])
+        for artist_name, album_title, song_title, genre, year in clean_songs
+    ]
+
+    cursor.executemany(
+        "INSERT INTO songs (title, album_id) VALUES (?, ?)", songs_to_add
     )
 
+    return len(songs_to_add)
+
 
 # ============================================
 # STEP 4: EXPORT TO CSV FILES
 # ============================================
 
 
-def export_to_csv(cursor, table_name):
+# Ready-made line formats for tables whose columns can never be NULL
+# (see create_tables). Filling in a format string is much faster than
+# having csv.writer inspect every value. Lines end in "\r\n" like csv.writer.
+FAST_CSV_FORMATS = {
+    "artists": "%d,%s\r\n",  # id, name
+    "songs": "%d,%s,%d\r\n",  # id, title, album_id
+}
+
+
+def write_rows(file, writer, rows, row_format=None):
+    """
+    Write one chunk of rows to a CSV file.
+    With a row_format (see FAST_CSV_FORMATS) the lines are built directly;
+    if a value has a comma, quote, or line break inside it, the chunk goes
+    through csv.writer instead so it gets quoted properly.
+    """
+    if row_format:
+        text = "".join([row_format % row for row in rows])
+
+        # Only the commas and line endings we added ourselves? Then it's safe!
+        if (
+            text.count(",") == row_format.count(",") * len(rows)
+            and text.count("\n") == len(rows)
+            and text.count("\r") == len(rows)
+            and '"' not in text
+        ):
+            file.write(text)
+            return
+
+    writer.writerows(rows)
+
+
+def export_to_csv(cursor, table_name, compress=False):
     """
     Export a database table to a CSV file.
     CSV = Comma Separated Values (opens in Excel!)
     Uses Python's built-in csv module for proper formatting.
+    Rows are read and written CSV_CHUNK_ROWS at a time, so even a huge table
+    never has to fit in memory all at once.
+    With compress=True the file is gzip-compressed and ends in .csv.gz.
+    Returns a message describing what was exported.
     """
-    # Get all data from the table
+    # Get the data from the table, starting with the first chunk of rows
     cursor.execute(f"SELECT * FROM {table_name}")
-    rows = cursor.fetchall()
+    rows = cursor.fetchmany(CSV_CHUNK_ROWS)
 
     if not rows:
-        print(f"   ⚠️ Table '{table_name}' is empty")
-        return
+        return f"   ⚠️ Table '{table_name}' is empty"
 
     # Get column names (like "id", "name", etc.)
     columns = [description[0] for description in cursor.description]
+    row_format = FAST_CSV_FORMATS.get(table_name)
 
     # Write to CSV file using csv module
     filename = os.path.join(EXPORTS_FOLDER, f"{table_name}.csv")
-    with open(filename, "w", newline="", encoding="utf-8") as file:
+    if compress:
+        # Level 1 = fastest compression; CSV text still shrinks a lot
+        filename += ".gz"
+        file = gzip.open(
+            filename, "wt", newline="", encoding="utf-8", compresslevel=1
+        )
+    else:
+        # A bigger buffer means fewer (slow) writes to disk
+        file = open(
+            filename, "w", newline="", encoding="utf-8", buffering=CSV_BUFFER_SIZE
+        )
+
+    row_count = 0
+    with file:
         writer = csv.writer(file)
 
         # Write header row
         writer.writerow(columns)
 
-        # Write all data rows
-        writer.writerows(rows)
+        # Write the data rows one chunk at a time
+        while rows:
+            write_rows(file, writer, rows, row_format)
+            row_count += len(rows)
+            rows = cursor.fetchmany(CSV_CHUNK_ROWS)
+
+    return f"   ✅ Exported {row_count} rows to {filename}"
 
-    print(f"   ✅ Exported {len(rows)} rows to {filename}")
+
+def export_table(table_name):
+    """
+    Export one table using its own database connection.
+    Each export runs in its own thread, and SQLite connections shouldn't be
+    shared between threads, so every thread opens (and closes) its own.
+    Returns the message from export_to_csv.
+    """
+    connection = sqlite3.connect(DATABASE_FILE)
+    try:
+        return export_to_csv(connection.cursor(), table_name, compress=COMPRESS_CSV)
+    finally:
+        connection.close()
 
 
 # ============================================
@@ -254,43 +414,90 @@ def main():
         print(f"✅ Created '{EXPORTS_FOLDER}' folder")
 
     # Connect to database (creates file if it doesn't exist)
+    # isolation_level=None means we decide ourselves when a transaction
+    # starts (BEGIN) and ends (COMMIT) instead of Python doing it for us.
     connection = sqlite3.connect(DATABASE_FILE)
+    connection.isolation_level = None
     cursor = connection.cursor()
+
+    # Write-ahead logging = no separate rollback journal to write, and with
+    # NORMAL sync SQLite doesn't wait for the disk on every commit (but the
+    # file stays safe from corruption, even if the computer crashes).
+    # Temporary data and a ~20 MB page cache stay in memory.
+    cursor.executescript(
+        """
+        PRAGMA journal_mode = WAL;
+        PRAGMA synchronous = NORMAL;
+        PRAGMA temp_store = MEMORY;
+        PRAGMA cache_size = -20000;
+    """
+    )
     print(f"✅ Connected to database: {DATABASE_FILE}")
 
     # Create our three tables
     create_tables(cursor)
 
-    # Fetch songs from iTunes for each artist
-    all_songs = []
-    for artist in ARTISTS:
-        songs = fetch_songs_from_itunes(artist)
-        all_songs.extend(songs)  # Add to our master list
-
-    print(f"\n📊 Total songs collected: {len(all_songs)}")
+    # Dictionaries to track what we've already saved
+    saved_artists = {}  # artist_name -> artist_id
+    saved_albums = {}  # (album_title, artist_id) -> album_id
+    songs_collected = 0
+    songs_saved = 0
+
+    # Fetch songs from iTunes for all artists at once, and save each
+    # artist's songs while the other requests are still downloading.
+    # Each request spends most of its time waiting on the network, so running
+    # them side by side takes about as long as the slowest single request.
+    # map() still hands results back in ARTISTS order, so runs stay consistent.
+    # Only this main thread touches the database; the worker threads just fetch.
+    #
+    # All inserts share ONE transaction, so SQLite only has to flush
+    # to disk once at COMMIT instead of once per row.
+    print(f"\n🔍 Searching iTunes for {len(ARTISTS)} artists...")
+    cursor.execute("BEGIN")
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+        results = executor.map(fetch_songs_from_itunes, ARTISTS)
+        for artist, (songs, error) in zip(ARTISTS, results):
+            if error:
+                print(f"   ⚠️ Error for '{artist}': {error}")
+            else:
+                print(f"   Found {len(songs)} songs for '{artist}'!")
+            songs_collected += len(songs)
+            songs_saved += save_to_database(
+                cursor, songs, saved_artists, saved_albums
+            )
+    cursor.execute("COMMIT")  # Save changes permanently
 
-    # Save everything to the database
-    if all_songs:
-        save_to_database(cursor, all_songs)
-        connection.commit()  # Save changes permanently
+    print(f"\n📊 Total songs collected: {songs_collected}")
+    print(
+        f"💾 Saved {len(saved_artists)} artists, {len(saved_albums)} albums, {songs_saved} songs!"
+    )
 
-    # Export to CSV files
-    print("\n📄 Exporting to CSV files...")
-    export_to_csv(cursor, "artists")
-    export_to_csv(cursor, "albums")
-    export_to_csv(cursor, "songs")
+    # Add indexes now that the data is in, then gather statistics
+    # so SQLite's query planner knows how to use them
+    create_indexes(cursor)
+    cursor.execute("ANALYZE")
 
-    # Close the database connection
+    # Close the database connection (all our changes are committed)
     connection.close()
 
+    # Export to CSV files, all three tables at the same time.
+    # Thanks to WAL mode, several connections can read the database at once.
+    print("\n📄 Exporting to CSV files...")
+    tables = ["artists", "albums", "songs"]
+    with ThreadPoolExecutor(max_workers=len(tables)) as executor:
+        # Print from here (not from the threads) so lines come out in order
+        for message in executor.map(export_table, tables):
+            print(message)
+
     print("\n" + "=" * 50)
     print("🎉 ALL DONE!")
     print("=" * 50)
     print(f"Check the '{EXPORTS_FOLDER}' folder for these files:")
+    csv_extension = ".csv.gz" if COMPRESS_CSV else ".csv"
     print(f"  • music_library.db (SQLite database)")
-    print(f"  • artists.csv")
-    print(f"  • albums.csv")
-    print(f"  • songs.csv")
+    print(f"  • artists{csv_extension}")
+    print(f"  • albums{csv_extension}")
+    print(f"  • songs{csv_extension}")
     print("\nOpen the .db file in a SQLite viewer to explore!")
 
 
@@ -7,6 +7,7 @@ It provides insights into artists, albums, songs, and their relationships.
 
 import sqlite3
 import os
+import random
 
 # Database configuration
 EXPORTS_FOLDER = "exports"
@@ -20,6 +21,31 @@ def print_section(title):
     print("=" * 60)
 
 
+def build_album_summary(cursor):
+    """Build the shared per-album temp table (safe to call more than once)."""
+    cursor.execute(
+        """
+        CREATE TEMP TABLE IF NOT EXISTS album_summary AS
+        WITH song_counts AS (
+            SELECT album_id, COUNT(*) as song_count
+            FROM songs
+            GROUP BY album_id
+        )
+        SELECT 
+            al.id as album_id,
+            al.title,
+            al.year,
+            al.genre,
+            a.id as artist_id,
+            a.name as artist,
+            sc.song_count
+        FROM albums al
+        JOIN artists a ON al.artist_id = a.id
+        JOIN song_counts sc ON sc.album_id = al.id
+    """
+    )
+
+
 def get_basic_statistics(cursor):
     """Display basic record counts for all tables."""
     print_section("DATABASE OVERVIEW")
@@ -34,17 +60,16 @@ def get_basic_statistics(cursor):
 def get_top_artists(cursor, limit=10):
     """Display artists ranked by number of albums."""
     print_section("TOP ARTISTS BY ALBUM COUNT")
+    build_album_summary(cursor)
 
     cursor.execute(
         """
         SELECT 
-            a.name,
-            COUNT(DISTINCT al.id) as album_count,
-            COUNT(s.id) as song_count
-        FROM artists a
-        JOIN albums al ON al.artist_id = a.id
-        JOIN songs s ON s.album_id = al.id
-        GROUP BY a.id, a.name
+            artist,
+            COUNT(*) as album_count,
+            SUM(song_count) as song_count
+        FROM album_summary
+        GROUP BY artist_id, artist
         ORDER BY album_count DESC, song_count DESC
         LIMIT ?
     """,
@@ -113,63 +138,52 @@ def get_year_distribution(cursor):
 def get_prolific_albums(cursor, limit=10):
     """Display albums with the most songs."""
     print_section("ALBUMS WITH MOST SONGS")
+    build_album_summary(cursor)
 
     cursor.execute(
         """
-        SELECT 
-            al.title,
-            a.name as artist,
-            al.year,
-            COUNT(s.id) as song_count
-        FROM albums al
-        JOIN artists a ON al.artist_id = a.id
-        JOIN songs s ON s.album_id = al.id
-        GROUP BY al.id, al.title, a.name, al.year
+        SELECT title, artist, year, song_count
+        FROM album_summary
         ORDER BY song_count DESC
         LIMIT ?
     """,
         (limit,),
     )
 
-    print(f"\n  {'Album':<35} {'Artist':<25} {'Year':<8} {'Songs'}")
+    # Build the row layout once, then reuse it for every row
+    row_format = "  {:<35} {:<25} {:<8} {}".format
+    print("\n" + row_format("Album", "Artist", "Year", "Songs"))
     print("  " + "-" * 75)
 
     for row in cursor.fetchall():
         album, artist, year, songs = row
-        year_str = str(year) if year else "N/A"
-        print(f"  {album[:34]:<35} {artist[:24]:<25} {year_str:<8} {songs}")
+        print(row_format(album[:34], artist[:24], year or "N/A", songs))
 
 
 def get_recent_albums(cursor, limit=10):
     """Display most recent albums."""
     print_section("MOST RECENT ALBUMS")
+    build_album_summary(cursor)
 
     cursor.execute(
         """
-        SELECT 
-            al.title,
-            a.name as artist,
-            al.year,
-            al.genre,
-            COUNT(s.id) as song_count
-        FROM albums al
-        JOIN artists a ON al.artist_id = a.id
-        JOIN songs s ON s.album_id = al.id
-        WHERE al.year IS NOT NULL
-        GROUP BY al.id, al.title, a.name, al.year, al.genre
-        ORDER BY al.year DESC
+        SELECT title, artist, year, genre, song_count
+        FROM album_summary
+        WHERE year IS NOT NULL
+        ORDER BY year DESC
         LIMIT ?
     """,
         (limit,),
     )
 
-    print(f"\n  {'Album':<30} {'Artist':<20} {'Year':<8} {'Genre':<15}")
+    # Build the row layout once, then reuse it for every row
+    row_format = "  {:<30} {:<20} {:<8} {:<15}".format
+    print("\n" + row_format("Album", "Artist", "Year", "Genre"))
     print("  " + "-" * 73)
 
     for row in cursor.fetchall():
         album, artist, year, genre, songs = row
-        genre_str = genre[:14] if genre else "N/A"
-        print(f"  {album[:29]:<30} {artist[:19]:<20} {year:<8} {genre_str:<15}")
+        print(row_format(album[:29], artist[:19], year, (genre or "N/A")[:14]))
 
 
 def get_artist_diversity(cursor):
@@ -209,9 +223,18 @@ def get_sample_songs(cursor, limit=15):
     """Display a sample of songs with their details."""
     print_section("SAMPLE SONGS")
 
+    # Pick random song IDs in Python and look them up by primary key,
+    # instead of ORDER BY RANDOM() which shuffles the whole songs table.
+    # We pick twice as many IDs as needed in case some were deleted.
+    cursor.execute("SELECT MAX(id) FROM songs")
+    max_id = cursor.fetchone()[0] or 0
+    sample_ids = random.sample(range(1, max_id + 1), min(limit * 2, max_id))
+
+    placeholders = ", ".join("?" * len(sample_ids))
     cursor.execute(
-        """
+        f"""
         SELECT 
+            s.id,
             s.title,
             a.name as artist,
             al.title as album,
@@ -219,16 +242,18 @@ def get_sample_songs(cursor, limit=15):
         FROM songs s
         JOIN albums al ON s.album_id = al.id
         JOIN artists a ON al.artist_id = a.id
-        ORDER BY RANDOM()
-        LIMIT ?
+        WHERE s.id IN ({placeholders})
     """,
-        (limit,),
+        sample_ids,
     )
+    songs_by_id = {row[0]: row[1:] for row in cursor.fetchall()}
 
     print(f"\n  {'Song':<35} {'Artist':<20} {'Album':<30}")
     print("  " + "-" * 85)
 
-    for row in cursor.fetchall():
+    # Keep the random order of sample_ids (SQLite returns them sorted by ID)
+    picked = [songs_by_id[i] for i in sample_ids if i in songs_by_id][:limit]
+    for row in picked:
         song, artist, album, year = row
         print(f"  {song[:34]:<35} {artist[:19]:<20} {album[:29]:<30}")
 
@@ -236,17 +261,13 @@ def get_sample_songs(cursor, limit=15):
 def get_database_insights(cursor):
     """Display interesting insights about the database."""
     print_section("DATABASE INSIGHTS")
+    build_album_summary(cursor)
 
     # Average songs per album
     cursor.execute(
         """
         SELECT AVG(song_count) as avg_songs
-        FROM (
-            SELECT COUNT(s.id) as song_count
-            FROM albums al
-            JOIN songs s ON s.album_id = al.id
-            GROUP BY al.id
-        )
+        FROM album_summary
     """
     )
     avg_songs = cursor.fetchone()[0]
@@ -332,7 +353,8 @@ def search_artist(cursor, artist_name):
                 print(f"  Active years: {first_year} - {last_year}")
 
         # Show albums
-        print(f"\n  {'Album':<40} {'Year':<8} {'Genre':<20} {'Songs'}")
+        row_format = "  {:<40} {:<8} {:<20} {}".format
+        print("\n" + row_format("Album", "Year", "Genre", "Songs"))
         print("  " + "-" * 75)
 
         cursor.execute(
@@ -354,9 +376,7 @@ def search_artist(cursor, artist_name):
 
         for row in cursor.fetchall():
             album, year, genre, songs = row
-            year_str = str(year) if year else "N/A"
-            genre_str = genre[:19] if genre else "N/A"
-            print(f"  {album[:39]:<40} {year_str:<8} {genre_str:<20} {songs}")
+            print(row_format(album[:39], year or "N/A", (genre or "N/A")[:19], songs))
     else:
         print(f"\n  No results found for '{artist_name}'")
 